@@ -33,6 +33,9 @@ class Settings(BaseSettings):
 
     # 数据库配置 - 默认使用 exe 同目录
     DATABASE_URL: str = get_default_database_url()
+    # 连接池配置（仅对 PostgreSQL/MySQL 生效，SQLite 不使用连接池）
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
     
     # Redis 配置
     REDIS_URL: str = "redis://IP:6379/0"
@@ -55,6 +58,16 @@ class Settings(BaseSettings):
     MAX_CONCURRENT_USERS: int = 5
     DEFAULT_USAGE_LIMIT: int = 1
     SEGMENT_SKIP_THRESHOLD: int = 15
+    # 段落级并发数：1 表示顺序处理（保持历史上下文因果链），
+    # 大于 1 时并发处理段落，历史上下文使用冻结快照
+    SEGMENT_CONCURRENCY: int = 1
+    # 批处理大小：大于等于 2 时将多个段落打包为一次 LLM 调用（仅并发模式生效），
+    # 减少请求往返次数并摊薄系统提示词的 token 成本
+    SEGMENT_BATCH_SIZE: int = 1
+    # 响应缓存：同样的段落（同阶段/模型/提示词）重试时直接复用之前的输出
+    RESPONSE_CACHE_ENABLED: bool = True
+    # 进度提交节流：每处理 N 个段落才把进度写入数据库一次，减少 fsync 次数
+    PROGRESS_COMMIT_EVERY: int = 5
 
     # Word Formatter 文件上传限制 (MB)，0 表示无限制
     MAX_UPLOAD_FILE_SIZE_MB: int = 0
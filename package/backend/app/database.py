@@ -3,10 +3,23 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+if "sqlite" in settings.DATABASE_URL:
+    # SQLite: 单文件数据库，连接池意义不大，只需放开线程检查
+    engine = create_engine(
+        settings.DATABASE_URL,
+        connect_args={"check_same_thread": False}
+    )
+else:
+    # PostgreSQL/MySQL: 真正的连接池，按并发段落任务的规模设置容量，
+    # 避免默认的小池子在段落级并发下成为串行化瓶颈；
+    # pool_pre_ping 剔除被服务端断开的陈旧连接
+    engine = create_engine(
+        settings.DATABASE_URL,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=1800
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -78,6 +91,8 @@ def _add_performance_indexes():
             ("idx_change_log_session_id", "change_logs", "session_id"),
             ("idx_change_log_segment_index", "change_logs", "segment_index"),
             ("idx_change_log_stage", "change_logs", "stage"),
+            # 变更记录去重查询的组合索引 (session_id, segment_index, stage)
+            ("idx_change_log_sss", "change_logs", "session_id, segment_index, stage"),
         ]
         
         with engine.connect() as conn:
@@ -107,7 +122,36 @@ def _add_performance_indexes():
                     conn.rollback()
                     # 静默失败，不阻止应用启动
                     pass
-    
+
+            # 部分索引：只覆盖压缩后的历史记录（表里也只保存压缩历史），
+            # 恢复运行按 (session_id, stage) 查最新压缩历史时只扫描少量行
+            # （SQLite 和 PostgreSQL 都支持带 WHERE 子句的部分索引）
+            partial_indexes = [
+                ("idx_session_history_compressed", "session_history",
+                 "session_id, stage", "is_compressed"),
+            ]
+            for index_name, table_name, column_name, where_clause in partial_indexes:
+                if table_name not in tables:
+                    continue
+
+                try:
+                    existing_indexes = inspector.get_indexes(table_name)
+                    index_names = {idx['name'] for idx in existing_indexes}
+
+                    if index_name in index_names:
+                        continue
+
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} "
+                        f"({column_name}) WHERE {where_clause}"
+                    ))
+                    conn.commit()
+                    print(f"  ✓ 添加索引: {index_name}")
+
+                except Exception as e:
+                    conn.rollback()
+                    pass
+
     except Exception as e:
         print(f"  ⚠ 添加性能索引警告: {str(e)}")
         # 失败不应该阻止应用启动
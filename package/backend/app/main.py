@@ -149,6 +149,10 @@ async def shutdown_event():
     job_manager = get_job_manager()
     await job_manager.shutdown()
 
+    # 关闭 AI 服务共享的 HTTP 连接池
+    from app.services.ai_service import close_shared_http_client
+    await close_shared_http_client()
+
 
 @app.get("/")
 async def root():
@@ -137,6 +137,22 @@ class ChangeLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class ResponseCache(Base):
+    """AI 响应缓存表 (按输入内容精确匹配)
+
+    缓存键为 sha256(stage|model|prompt|input_text)，同样的段落在
+    重试或重新运行时可以直接复用之前的 AI 输出，省去一次调用。
+    """
+    __tablename__ = "response_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, index=True, nullable=False)
+    stage = Column(String(50))
+    output_text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_hit_at = Column(DateTime, nullable=True)
+
+
 class QueueStatus(Base):
     """队列状态表"""
     __tablename__ = "queue_status"
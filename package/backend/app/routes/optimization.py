@@ -12,6 +12,7 @@ from app.schemas import (
 from app.services.optimization_service import OptimizationService
 from app.services.concurrency import concurrency_manager
 from app.services.stream_manager import stream_manager
+from app.services.progress_store import progress_store
 from app.utils.auth import generate_session_id
 from datetime import datetime
 import asyncio
@@ -207,7 +208,22 @@ async def get_session_progress(
     
     if not session:
         raise HTTPException(status_code=404, detail="会话不存在")
-    
+
+    # 处理中的会话优先读取 Redis 中的实时进度（逐段更新不再写数据库），
+    # Redis 无数据或不可用时回退到数据库中的值
+    if session.status == "processing":
+        live = await progress_store.get_progress(session_id)
+        if live:
+            return ProgressUpdate(
+                session_id=session.session_id,
+                status=session.status,
+                progress=float(live.get("progress", session.progress or 0)),
+                current_position=int(live.get("pos", session.current_position or 0)),
+                total_segments=session.total_segments,
+                current_stage=live.get("stage") or session.current_stage,
+                error_message=session.error_message
+            )
+
     return ProgressUpdate(
         session_id=session.session_id,
         status=session.status,
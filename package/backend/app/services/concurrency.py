@@ -111,5 +111,58 @@ class ConcurrencyManager:
             self.active_sessions[next_session] = datetime.utcnow()
 
 
+class AdaptiveConcurrencyLimiter:
+    """自适应并发限流器（TCP 风格的 AIMD 策略）
+
+    固定并发数要么吃不满上游容量，要么触发 429 限流导致段落失败。
+    本限流器在请求成功时线性增加并发上限（加性增），在遇到限流/过载
+    错误时将并发上限减半（乘性减），使吞吐量稳定在上游 API 容量
+    拐点附近而无需手工调参。
+    """
+
+    def __init__(self, min_concurrency: int = 1, max_concurrency: int = 8, initial: int = 2):
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self._limit = min(max(initial, self.min_concurrency), self.max_concurrency)
+        self._active = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    @property
+    def current_limit(self) -> int:
+        """当前并发上限"""
+        return self._limit
+
+    async def acquire(self):
+        """获取一个并发槽位，达到上限时等待"""
+        async with self._condition:
+            while self._active >= self._limit:
+                await self._condition.wait()
+            self._active += 1
+
+    async def release(self, overloaded: bool = False):
+        """释放槽位并根据结果调整并发上限
+
+        Args:
+            overloaded: 本次请求是否因上游限流/过载失败
+        """
+        async with self._condition:
+            self._active -= 1
+            if overloaded:
+                # 乘性减：遇到过载立即减半，快速退避
+                new_limit = max(self.min_concurrency, self._limit // 2)
+                if new_limit != self._limit:
+                    print(f"[ADAPTIVE] 检测到上游过载，并发上限 {self._limit} -> {new_limit}", flush=True)
+                self._limit = new_limit
+                self._successes = 0
+            else:
+                # 加性增：每成功完成一轮当前并发数的请求，上限加 1
+                self._successes += 1
+                if self._successes >= self._limit and self._limit < self.max_concurrency:
+                    self._limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
 # 全局并发管理器实例
 concurrency_manager = ConcurrencyManager()
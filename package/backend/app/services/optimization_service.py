@@ -1,24 +1,38 @@
 import json
+import hashlib
 import asyncio
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from app.models.models import (
-    OptimizationSession, OptimizationSegment, 
-    SessionHistory, ChangeLog
+    OptimizationSession, OptimizationSegment,
+    SessionHistory, ChangeLog, ResponseCache
 )
 from app.services.ai_service import (
-    AIService, split_text_into_segments,
+    AIService, split_text_into_segments, is_overload_error,
     count_chinese_characters, count_text_length, get_default_polish_prompt,
     get_default_enhance_prompt, get_emotion_polish_prompt, get_compression_prompt
 )
-from app.services.concurrency import concurrency_manager
+from app.services.concurrency import concurrency_manager, AdaptiveConcurrencyLimiter
 from app.services.stream_manager import stream_manager
+from app.services.progress_store import progress_store
 from app.config import settings
 
 # 错误信息最大长度，避免数据库字段溢出
 MAX_ERROR_MESSAGE_LENGTH = 500
 
+# 压缩结果内存缓存的容量上限（LRU 淘汰）
+_COMPRESSION_CACHE_MAX = 128
+
+# 批处理调用时各阶段附加的任务说明
+_BATCH_TASK_LINES = {
+    "polish": "请对以下每个段落进行润色:",
+    "emotion_polish": "请对以下每个段落进行感情文章润色:",
+    "enhance": "请增强以下每个段落的原创性和学术表达:",
+}
+
 
 class OptimizationService:
     """优化处理服务"""
@@ -30,6 +44,13 @@ class OptimizationService:
         self.enhance_service: Optional[AIService] = None
         self.emotion_service: Optional[AIService] = None
         self.compression_service: Optional[AIService] = None
+        # (segment_index, stage) -> ChangeLog，在 _process_stage 开始时预加载
+        self._change_log_cache: Dict[tuple, ChangeLog] = {}
+        # 压缩结果缓存：sha256(输入消息) -> 压缩摘要，LRU 淘汰
+        self._compression_cache: "OrderedDict[str, str]" = OrderedDict()
+        # 阶段上下文：stage -> {service, prompt, call, output_attr}，
+        # 在 _init_ai_services 中一次性绑定
+        self._stage_ctx: Dict[str, dict] = {}
     
     def _init_ai_services(self):
         """初始化AI服务
@@ -68,8 +89,31 @@ class OptimizationService:
                 base_url=settings.COMPRESSION_BASE_URL or settings.OPENAI_BASE_URL
             )
             
+            # 每个阶段的服务/提示词/调用方法/输出字段一次性绑定，
+            # 热循环中用查表替代逐段落的 if/elif 分支，提示词每阶段只构造一次
+            self._stage_ctx = {
+                "polish": {
+                    "service": self.polish_service,
+                    "prompt": get_default_polish_prompt(),
+                    "call": self.polish_service.polish_text,
+                    "output_attr": "polished_text",
+                },
+                "emotion_polish": {
+                    "service": self.emotion_service,
+                    "prompt": get_emotion_polish_prompt(),
+                    "call": self.emotion_service.polish_emotion_text,
+                    "output_attr": "polished_text",
+                },
+                "enhance": {
+                    "service": self.enhance_service,
+                    "prompt": get_default_enhance_prompt(),
+                    "call": self.enhance_service.enhance_text,
+                    "output_attr": "enhanced_text",
+                },
+            }
+
             print(f"[INFO] 所有 AI 服务初始化成功，会话: {self.session_obj.session_id}")
-            
+
         except Exception as e:
             error_msg = f"AI 服务初始化失败: {str(e)}"
             print(f"[ERROR] {error_msg}")
@@ -117,15 +161,20 @@ class OptimizationService:
                 self.session_obj.total_segments = len(segments)
                 self.db.commit()
 
-                for idx, segment_text in enumerate(segments):
-                    segment = OptimizationSegment(
-                        session_id=self.session_obj.id,
-                        segment_index=idx,
-                        stage="polish",
-                        original_text=segment_text,
-                        status="pending"
-                    )
-                    self.db.add(segment)
+                # 单条 INSERT 批量创建全部段落记录，避免逐行 add 时
+                # flush 出 N 条 INSERT（长文档可能有数百个段落）
+                self.db.execute(insert(OptimizationSegment), [
+                    {
+                        "session_id": self.session_obj.id,
+                        "segment_index": idx,
+                        "stage": "polish",
+                        "original_text": segment_text,
+                        "status": "pending",
+                        "is_title": False,
+                        "created_at": datetime.utcnow(),
+                    }
+                    for idx, segment_text in enumerate(segments)
+                ])
                 self.db.commit()
             else:
                 # 继续运行: 同步总段落数
@@ -168,6 +217,8 @@ class OptimizationService:
             self.db.commit()
             raise
         finally:
+            # 会话结束后清理 Redis 中的实时进度，数据库值成为权威来源
+            await progress_store.clear(self.session_obj.session_id)
             # 释放并发权限
             await concurrency_manager.release(self.session_obj.session_id)
             # 清理 AI 服务资源
@@ -181,25 +232,29 @@ class OptimizationService:
         self.enhance_service = None
         self.emotion_service = None
         self.compression_service = None
+        self._stage_ctx = {}
     
     async def _process_stage(self, stage: str):
         """处理单个阶段"""
         print(f"\n[STAGE START] Stage: {stage}, Session: {self.session_obj.session_id}", flush=True)
-        
+
         self.session_obj.current_stage = stage
         self.db.commit()
-        
-        # 获取该阶段的提示词
-        prompt = self._get_prompt(stage)
-        
-        # 获取AI服务
-        if stage == "emotion_polish":
-            ai_service = self.emotion_service
-        elif stage == "polish":
-            ai_service = self.polish_service
-        else:  # enhance
-            ai_service = self.enhance_service
-        
+
+        # 阶段上下文（服务与提示词）在 _init_ai_services 中已绑定
+        ctx = self._stage_ctx[stage]
+        prompt = ctx["prompt"]
+        ai_service = ctx["service"]
+
+        # 预加载该会话已有的变更记录，消除每段落一次的 SELECT（N+1 查询）
+        # 按 created_at 升序加载，同键的历史重复记录以最新一条为准
+        self._change_log_cache = {
+            (log.segment_index, log.stage): log
+            for log in self.db.query(ChangeLog).filter(
+                ChangeLog.session_id == self.session_obj.id
+            ).order_by(ChangeLog.created_at).all()
+        }
+
         # 获取所有段落
         segments = self.db.query(OptimizationSegment).filter(
             OptimizationSegment.session_id == self.session_obj.id
@@ -212,22 +267,28 @@ class OptimizationService:
         
         # 历史会话 - 只包含AI的回复内容
         # 只加载 start_index 之前的段落到历史，避免重试时历史与当前处理位置不一致
+        # 只取当前阶段需要的文本列并流式读取，避免把所有 TEXT 列
+        # 全量水合成 ORM 对象（长文档下是主要的内存开销）
         history: List[Dict[str, str]] = []
         total_chars = 0
 
-        for segment in segments[:start_index]:
-            if segment.is_title:
-                # 标题段落不参与历史上下文
-                continue
-            if stage == "polish" and segment.polished_text:
-                history.append({"role": "assistant", "content": segment.polished_text})
-                total_chars += count_chinese_characters(segment.polished_text)
-            elif stage == "emotion_polish" and segment.polished_text:
-                history.append({"role": "assistant", "content": segment.polished_text})
-                total_chars += count_chinese_characters(segment.polished_text)
-            elif stage == "enhance" and segment.enhanced_text:
-                history.append({"role": "assistant", "content": segment.enhanced_text})
-                total_chars += count_chinese_characters(segment.enhanced_text)
+        history_col = (
+            OptimizationSegment.enhanced_text if stage == "enhance"
+            else OptimizationSegment.polished_text
+        )
+        # 过滤条件直接下推到 SQL：标题段落（is_title 为 NULL 的旧数据视同非标题）
+        # 和未完成段落在数据库侧就被排除，不再传输到 Python 侧逐行判断
+        preload_rows = self.db.query(history_col).filter(
+            OptimizationSegment.session_id == self.session_obj.id,
+            OptimizationSegment.segment_index < start_index,
+            OptimizationSegment.is_title.isnot(True),
+            history_col.isnot(None)
+        ).order_by(OptimizationSegment.segment_index).yield_per(200)
+
+        for (content,) in preload_rows:
+            if content:
+                history.append({"role": "assistant", "content": content})
+                total_chars += count_chinese_characters(content)
         
         print(f"[STAGE] Loaded {len(history)} history messages from segments[:start_index={start_index}]", flush=True)
         
@@ -236,129 +297,79 @@ class OptimizationService:
         # 获取处理模式，用于正确计算进度
         processing_mode = self.session_obj.processing_mode or 'paper_polish_enhance'
 
+        # 并发模式：段落间不再链式追加历史，使用冻结快照并发处理
+        concurrency = max(settings.SEGMENT_CONCURRENCY, 1)
+        if concurrency > 1:
+            await self._process_segments_concurrent(
+                stage, segments, start_index, history,
+                ai_service, prompt, skip_threshold, processing_mode, concurrency
+            )
+            return
+
+        progress_commit_every = max(settings.PROGRESS_COMMIT_EVERY, 1)
+
         for idx, segment in enumerate(segments[start_index:], start=start_index):
             # 每次处理段落前检查会话状态
             self.db.refresh(self.session_obj)
             if self.session_obj.status == "stopped":
                 raise Exception("会话已被用户停止")
 
-            # 更新进度（无论是否跳过都更新）
+            # 更新进度（无论是否跳过都更新）；进度本身只服务于前端轮询，
+            # 优先写入 Redis，数据库只在阶段边界落盘；
+            # Redis 不可用时按 PROGRESS_COMMIT_EVERY 节流提交数据库
             self.session_obj.current_position = idx
-            # 根据处理模式正确计算进度
-            if processing_mode == 'paper_polish_enhance':
-                if stage == "polish":
-                    # 第一阶段占 0-50%
-                    progress = (idx / len(segments)) * 50
-                else:  # enhance
-                    # 第二阶段占 50-100%
-                    progress = 50 + (idx / len(segments)) * 50
-            else:
-                # 其他模式占 0-100%
-                progress = (idx / len(segments)) * 100
-            self.session_obj.progress = min(progress, 100.0)
-            self.db.commit()
+            self.session_obj.progress = self._stage_progress(idx, len(segments), stage, processing_mode)
+            wrote_redis = await progress_store.set_progress(
+                self.session_obj.session_id, self.session_obj.progress, idx, stage
+            )
+            if not wrote_redis and idx % progress_commit_every == 0:
+                self.db.commit()
 
             # 先判断标题和短段落（提前到这里）
-            if count_text_length(segment.original_text) < skip_threshold:
-                if not segment.is_title:
-                    segment.is_title = True
-                    segment.status = "completed"
-                    segment.polished_text = segment.original_text
-                    segment.enhanced_text = segment.original_text
-                    segment.completed_at = datetime.utcnow()
-                    segment.stage = stage
-                    self.db.commit()
+            if self._handle_title_segment(segment, stage, skip_threshold):
                 continue
 
             # 然后检查是否已处理
-            if stage in ["polish", "emotion_polish"] and segment.polished_text:
+            if self._is_segment_done(segment, stage):
                 continue
-            if stage == "enhance":
-                if segment.enhanced_text:
-                    continue
-                if segment.is_title and not segment.enhanced_text:
-                    segment.enhanced_text = segment.polished_text or segment.original_text
-                    segment.status = "completed"
-                    segment.completed_at = segment.completed_at or datetime.utcnow()
-                    self.db.commit()
-                    continue
 
             try:
 
                 print(f"\n[SEGMENT {idx}] Processing segment {idx+1}/{len(segments)}, Stage: {stage}", flush=True)
                 print(f"[SEGMENT {idx}] Input Length: {count_text_length(segment.original_text)}", flush=True)
-                
+
+                # 状态转移在内存中累积，随段落完成时的提交一并落盘
                 segment.status = "processing"
                 segment.stage = stage
-                self.db.commit()
-                
-                # 准备输入文本
-                # 对于 enhance 阶段：如果有润色结果则使用，否则使用原文（适用于 paper_enhance 模式）
-                if stage == "enhance":
-                    input_text = segment.polished_text if segment.polished_text else segment.original_text
-                else:
-                    input_text = segment.original_text
-                
-                # 调用AI
-                async def execute_call():
-                    # 使用配置中的流式设置，默认非流式（False）以避免API阻止
-                    use_stream = settings.USE_STREAMING
-                    
-                    if stage == "polish":
-                        response = await ai_service.polish_text(input_text, prompt, history, stream=use_stream)
-                    elif stage == "emotion_polish":
-                        response = await ai_service.polish_emotion_text(input_text, prompt, history, stream=use_stream)
-                    else:  # enhance
-                        response = await ai_service.enhance_text(input_text, prompt, history, stream=use_stream)
-                    
-                    if use_stream:
-                        full_text = ""
-                        async for chunk in response:
-                            if chunk:
-                                full_text += chunk
-                                # 推送流式更新
-                                await stream_manager.broadcast(self.session_obj.session_id, {
-                                    "type": "content",
-                                    "segment_index": idx,
-                                    "stage": stage,
-                                    "content": chunk,
-                                    "full_text": full_text  # 可选:发送全量或增量，这里发送增量chunk，全量用于恢复
-                                })
-                        return full_text
-                    else:
-                        return response
-
-                output_text = await self._run_with_retry(idx, stage, execute_call)
-
-                if stage in ["polish", "emotion_polish"]:
-                    segment.polished_text = output_text
-                else:  # enhance
-                    segment.enhanced_text = output_text
 
-                segment.status = "completed"
-                segment.completed_at = datetime.utcnow()
-                self.db.commit()
-                
-                # 记录变更
+                input_text = self._get_input_text(segment, stage)
+
+                output_text = await self._run_with_retry(
+                    idx, stage,
+                    lambda: self._execute_ai_call(idx, stage, ai_service, prompt, input_text, history)
+                )
+
+                self._apply_segment_output(segment, stage, output_text)
+                # 记录变更后统一提交：输出、状态与变更记录合并为一次事务
                 await self._record_change(segment, input_text, output_text, stage)
-                
+                self.db.commit()
+
                 # 更新历史会话 - 只添加AI的回复内容
                 history.append({"role": "assistant", "content": output_text})
                 total_chars += count_chinese_characters(output_text)
-                
+
                 # 检查是否需要压缩历史 - 基于字符数阈值
                 if total_chars > settings.HISTORY_COMPRESSION_THRESHOLD:
                     print(f"\n[HISTORY COMPRESS] Triggering compression, Stage: {stage}", flush=True)
                     print(f"[HISTORY COMPRESS] Before: {total_chars} chars, {len(history)} messages", flush=True)
-                    
-                    compressed_history = await self._compress_history(history, stage)
-                    # 压缩后的历史替换原历史，用于后续处理
-                    history = compressed_history
-                    # 重新计算字符数
-                    total_chars = sum(count_chinese_characters(msg.get("content", "")) for msg in history)
-                    
+
+                    # 压缩后的历史替换原历史，字符数由压缩过程增量维护，
+                    # 避免每次压缩后对全部历史做 O(N) 重新统计；
+                    # 压缩是否成功由 _compress_history 直接告知，无需事后检测
+                    history, total_chars, compressed = await self._compress_history(history, stage)
+
                     print(f"[HISTORY COMPRESS] After: {total_chars} chars, {len(history)} messages", flush=True)
-                    
+
                     # 推送压缩通知给前端
                     await stream_manager.broadcast(self.session_obj.session_id, {
                         "type": "history_compressed",
@@ -366,32 +377,385 @@ class OptimizationService:
                         "message": f"历史会话已压缩（{stage} 阶段），节省上下文空间",
                         "new_char_count": total_chars
                     })
-                    
+
                     # 只在压缩后保存历史，减少数据库写入
-                    await self._save_history(history, stage, total_chars)
-                
+                    await self._save_history(history, stage, total_chars, is_compressed=compressed)
+
             except Exception as e:
                 import traceback
                 error_trace = traceback.format_exc()
                 print(f"[ERROR] Segment {idx} processing failed:", flush=True)
                 print(error_trace, flush=True)
-                
-                segment.status = "failed"
-                self.session_obj.failed_segment_index = idx
-                
-                # 安全地截断错误信息，避免数据库字段溢出
-                error_msg = str(e)
-                if len(error_msg) > MAX_ERROR_MESSAGE_LENGTH:
-                    # 保留前面的主要错误信息和末尾的部分
-                    prefix_len = MAX_ERROR_MESSAGE_LENGTH - 50
-                    error_msg = error_msg[:prefix_len] + "... [错误信息已截断]"
-                
-                self.session_obj.error_message = error_msg
-                self.db.commit()
-                
+
+                self._mark_segment_failed(segment, idx, e)
+
                 # 直接抛出原异常，保留堆栈
                 raise
 
+        # 阶段边界：把最终进度/位置落盘（逐段进度只存在于 Redis）
+        self.db.commit()
+
+    def _stage_progress(self, idx: int, total: int, stage: str, processing_mode: str) -> float:
+        """根据处理模式计算当前进度百分比"""
+        if processing_mode == 'paper_polish_enhance':
+            if stage == "polish":
+                # 第一阶段占 0-50%
+                progress = (idx / total) * 50
+            else:  # enhance
+                # 第二阶段占 50-100%
+                progress = 50 + (idx / total) * 50
+        else:
+            # 其他模式占 0-100%
+            progress = (idx / total) * 100
+        return min(progress, 100.0)
+
+    def _handle_title_segment(self, segment: OptimizationSegment, stage: str, skip_threshold: int) -> bool:
+        """判断并处理标题/短段落：直接原样通过，不调用 AI
+
+        Returns:
+            True 表示该段落已按标题处理（或已是标题），无需 AI 调用
+        """
+        if count_text_length(segment.original_text) >= skip_threshold:
+            return False
+        if not segment.is_title:
+            segment.is_title = True
+            segment.status = "completed"
+            segment.polished_text = segment.original_text
+            segment.enhanced_text = segment.original_text
+            segment.completed_at = datetime.utcnow()
+            segment.stage = stage
+            self.db.commit()
+        return True
+
+    def _is_segment_done(self, segment: OptimizationSegment, stage: str) -> bool:
+        """检查段落在当前阶段是否已处理完成（断点续跑时跳过）"""
+        if stage in ["polish", "emotion_polish"] and segment.polished_text:
+            return True
+        if stage == "enhance":
+            if segment.enhanced_text:
+                return True
+            if segment.is_title and not segment.enhanced_text:
+                segment.enhanced_text = segment.polished_text or segment.original_text
+                segment.status = "completed"
+                segment.completed_at = segment.completed_at or datetime.utcnow()
+                self.db.commit()
+                return True
+        return False
+
+    @staticmethod
+    def _get_input_text(segment: OptimizationSegment, stage: str) -> str:
+        """准备输入文本
+
+        对于 enhance 阶段：如果有润色结果则使用，否则使用原文（适用于 paper_enhance 模式）
+        """
+        if stage == "enhance":
+            return segment.polished_text if segment.polished_text else segment.original_text
+        return segment.original_text
+
+    def _apply_segment_output(self, segment: OptimizationSegment, stage: str, output_text: str):
+        """将AI输出写入段落对应字段并标记完成"""
+        setattr(segment, self._stage_ctx[stage]["output_attr"], output_text)
+        segment.status = "completed"
+        segment.completed_at = datetime.utcnow()
+
+    async def _execute_ai_call(
+        self,
+        idx: int,
+        stage: str,
+        ai_service: AIService,
+        prompt: str,
+        input_text: str,
+        history: List[Dict[str, str]]
+    ) -> str:
+        """调用AI处理单个段落（含流式推送与响应缓存）"""
+        # 响应缓存：同样的输入（同阶段/模型/提示词）直接复用之前的输出，
+        # 主要惠及 failed_segment_index 之后的重试和重新运行。
+        # 注意缓存键不包含历史上下文，命中时会忽略风格上下文的细微差异。
+        cache_key = None
+        if settings.RESPONSE_CACHE_ENABLED:
+            cache_key = self._response_cache_key(stage, ai_service.model, prompt, input_text)
+            cached = self._lookup_cached_response(cache_key)
+            if cached is not None:
+                print(f"[CACHE] Segment {idx} 命中响应缓存，跳过 AI 调用", flush=True)
+                return cached
+
+        # 使用配置中的流式设置，默认非流式（False）以避免API阻止
+        use_stream = settings.USE_STREAMING
+
+        # 阶段到调用方法的绑定在 _init_ai_services 中完成，这里直接查表
+        response = await self._stage_ctx[stage]["call"](input_text, prompt, history, stream=use_stream)
+
+        if use_stream:
+            full_text = ""
+            async for chunk in response:
+                if chunk:
+                    full_text += chunk
+                    # 推送流式更新
+                    await stream_manager.broadcast(self.session_obj.session_id, {
+                        "type": "content",
+                        "segment_index": idx,
+                        "stage": stage,
+                        "content": chunk,
+                        "full_text": full_text  # 可选:发送全量或增量，这里发送增量chunk，全量用于恢复
+                    })
+            output_text = full_text
+        else:
+            output_text = response
+
+        if cache_key and output_text:
+            self._store_cached_response(cache_key, stage, output_text)
+        return output_text
+
+    @staticmethod
+    def _response_cache_key(stage: str, model: str, prompt: str, input_text: str) -> str:
+        """计算响应缓存键：sha256(stage|model|prompt|input_text)"""
+        raw = "|".join((stage, model or "", prompt, input_text))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _lookup_cached_response(self, cache_key: str) -> Optional[str]:
+        """查询响应缓存，命中时更新命中时间"""
+        try:
+            row = self.db.query(ResponseCache).filter(
+                ResponseCache.cache_key == cache_key
+            ).first()
+            if row is not None:
+                row.last_hit_at = datetime.utcnow()
+                self.db.commit()
+                return row.output_text
+        except Exception as e:
+            # 缓存故障不应阻断正常处理流程
+            print(f"[WARNING] 响应缓存查询失败: {str(e)}", flush=True)
+            self.db.rollback()
+        return None
+
+    def _store_cached_response(self, cache_key: str, stage: str, output_text: str):
+        """写入响应缓存（键已存在时跳过）"""
+        try:
+            exists = self.db.query(ResponseCache.id).filter(
+                ResponseCache.cache_key == cache_key
+            ).first()
+            if exists is None:
+                self.db.add(ResponseCache(
+                    cache_key=cache_key,
+                    stage=stage,
+                    output_text=output_text
+                ))
+                self.db.commit()
+        except Exception as e:
+            print(f"[WARNING] 响应缓存写入失败: {str(e)}", flush=True)
+            self.db.rollback()
+
+    def _mark_segment_failed(self, segment: OptimizationSegment, idx: int, error: Exception):
+        """记录段落失败状态，供下次运行从该段落恢复"""
+        segment.status = "failed"
+        self.session_obj.failed_segment_index = idx
+
+        # 安全地截断错误信息，避免数据库字段溢出
+        error_msg = str(error)
+        if len(error_msg) > MAX_ERROR_MESSAGE_LENGTH:
+            # 保留前面的主要错误信息和末尾的部分
+            prefix_len = MAX_ERROR_MESSAGE_LENGTH - 50
+            error_msg = error_msg[:prefix_len] + "... [错误信息已截断]"
+
+        self.session_obj.error_message = error_msg
+        self.db.commit()
+
+    async def _process_segments_concurrent(
+        self,
+        stage: str,
+        segments: List[OptimizationSegment],
+        start_index: int,
+        history: List[Dict[str, str]],
+        ai_service: AIService,
+        prompt: str,
+        skip_threshold: int,
+        processing_mode: str,
+        concurrency: int
+    ):
+        """并发处理段落（asyncio.gather + 自适应限流）
+
+        进入本方法时历史上下文被冻结为快照：所有并发段落共享同一份
+        上下文，段落之间不再互相追加历史（历史链式依赖与并发互斥），
+        因此并发模式下也不触发历史压缩。结果按段落顺序写回，
+        失败时以最早失败的段落作为恢复点。
+
+        并发度由自适应限流器动态调整：SEGMENT_CONCURRENCY 作为上限，
+        遇到上游限流/过载时自动收缩，成功时逐步扩张。
+        """
+        frozen_history = list(history)
+        limiter = AdaptiveConcurrencyLimiter(
+            min_concurrency=1,
+            max_concurrency=concurrency,
+            initial=min(2, concurrency)
+        )
+        total = len(segments)
+
+        # 先过滤掉标题/已完成的段落，只并发处理真正需要AI的段落
+        pending = []
+        for idx, segment in enumerate(segments[start_index:], start=start_index):
+            if self._handle_title_segment(segment, stage, skip_threshold):
+                continue
+            if self._is_segment_done(segment, stage):
+                continue
+            pending.append((idx, segment))
+
+        if not pending:
+            return
+
+        # 批处理分组：batch_size >= 2 时多个段落合并为一次 LLM 调用
+        batch_size = max(settings.SEGMENT_BATCH_SIZE, 1)
+        if batch_size > 1:
+            groups = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        else:
+            groups = [[item] for item in pending]
+
+        done_count = 0
+        failures: List[tuple] = []
+
+        # 并发路径不在 ORM 对象上做逐段状态转移和提交，而是把结果累积为
+        # mapping，gather 结束后用 bulk_update_mappings 一次性写回，
+        # 将 N 次 UPDATE 往返合并为单条语句
+        output_field = self._stage_ctx[stage]["output_attr"]
+        segment_rows: List[dict] = []
+        log_updates: List[dict] = []
+        log_inserts: List[dict] = []
+
+        def _collect_result(idx: int, segment: OptimizationSegment, input_text: str, output_text: str):
+            """把段落结果累积为批量写回的 mapping，并更新内存中的进度"""
+            nonlocal done_count
+            segment_rows.append({
+                "id": segment.id,
+                output_field: output_text,
+                "status": "completed",
+                "stage": stage,
+                "completed_at": datetime.utcnow(),
+            })
+
+            changes = {
+                "before_length": len(input_text),
+                "after_length": len(output_text),
+                "changed": input_text != output_text
+            }
+            serialized_detail = json.dumps(changes, ensure_ascii=False)
+            existing_log = self._change_log_cache.get((segment.segment_index, stage))
+            if existing_log is not None:
+                log_updates.append({
+                    "id": existing_log.id,
+                    "before_text": input_text,
+                    "after_text": output_text,
+                    "changes_detail": serialized_detail,
+                })
+            else:
+                log_inserts.append({
+                    "session_id": self.session_obj.id,
+                    "segment_index": segment.segment_index,
+                    "stage": stage,
+                    "before_text": input_text,
+                    "after_text": output_text,
+                    "changes_detail": serialized_detail,
+                })
+
+            done_count += 1
+            self.session_obj.current_position = max(self.session_obj.current_position or 0, idx)
+            self.session_obj.progress = self._stage_progress(
+                min(start_index + done_count, total), total, stage, processing_mode
+            )
+
+        async def _process_one(idx: int, segment: OptimizationSegment):
+            await limiter.acquire()
+            overloaded = False
+            try:
+                # 获取槽位后再检查会话状态，及时响应停止请求
+                self.db.refresh(self.session_obj)
+                if self.session_obj.status == "stopped":
+                    raise Exception("会话已被用户停止")
+
+                print(f"\n[SEGMENT {idx}] Processing segment {idx+1}/{total}, Stage: {stage} "
+                      f"(concurrent, limit={limiter.current_limit})", flush=True)
+
+                input_text = self._get_input_text(segment, stage)
+                try:
+                    output_text = await self._run_with_retry(
+                        idx, stage,
+                        lambda: self._execute_ai_call(idx, stage, ai_service, prompt, input_text, frozen_history)
+                    )
+                except Exception as exc:
+                    # 限流/过载类错误需要让限流器收缩并发上限
+                    overloaded = is_overload_error(exc)
+                    raise
+
+                _collect_result(idx, segment, input_text, output_text)
+                await progress_store.set_progress(
+                    self.session_obj.session_id, self.session_obj.progress,
+                    self.session_obj.current_position or 0, stage
+                )
+            finally:
+                await limiter.release(overloaded=overloaded)
+
+        async def _process_batch(group):
+            """一次 LLM 调用处理一组段落"""
+            await limiter.acquire()
+            overloaded = False
+            try:
+                self.db.refresh(self.session_obj)
+                if self.session_obj.status == "stopped":
+                    raise Exception("会话已被用户停止")
+
+                indices = [idx for idx, _ in group]
+                print(f"\n[BATCH] Processing segments {indices}, Stage: {stage} "
+                      f"(batch={len(group)}, limit={limiter.current_limit})", flush=True)
+
+                inputs = [self._get_input_text(segment, stage) for _, segment in group]
+                try:
+                    outputs = await ai_service.complete_batch(
+                        inputs, prompt, _BATCH_TASK_LINES[stage], frozen_history
+                    )
+                except Exception as exc:
+                    overloaded = is_overload_error(exc)
+                    raise
+
+                for (idx, segment), input_text, output_text in zip(group, inputs, outputs):
+                    _collect_result(idx, segment, input_text, output_text)
+                await progress_store.set_progress(
+                    self.session_obj.session_id, self.session_obj.progress,
+                    self.session_obj.current_position or 0, stage
+                )
+            finally:
+                await limiter.release(overloaded=overloaded)
+
+        async def _run_group(group):
+            """处理一组段落：优先批处理，失败时回退到单段调用"""
+            if len(group) >= 2:
+                try:
+                    await _process_batch(group)
+                    return
+                except Exception as exc:
+                    print(f"[BATCH] 批处理失败，回退到单段调用: {exc}", flush=True)
+            for idx, segment in group:
+                try:
+                    await _process_one(idx, segment)
+                except Exception as exc:
+                    failures.append((idx, segment, exc))
+
+        await asyncio.gather(*(_run_group(group) for group in groups))
+
+        # 并发批次完成后一次性批量写回段落输出与变更记录，单次提交
+        if segment_rows:
+            self.db.bulk_update_mappings(OptimizationSegment, segment_rows)
+            if log_updates:
+                self.db.bulk_update_mappings(ChangeLog, log_updates)
+            if log_inserts:
+                self.db.bulk_insert_mappings(ChangeLog, log_inserts)
+            self.db.commit()
+
+        # 按段落顺序定位第一个失败的段落，保证重试从最早失败处恢复
+        if failures:
+            failures.sort(key=lambda item: item[0])
+            idx, segment, error = failures[0]
+            print(f"[ERROR] Segment {idx} processing failed (concurrent): {error}", flush=True)
+            self._mark_segment_failed(segment, idx, error)
+            raise error
+
     async def _run_with_retry(self, segment_index: int, stage: str, task):
         """执行单次任务，不自动重试"""
         try:
@@ -401,31 +765,31 @@ class OptimizationService:
                 f"段落 {segment_index + 1} 在 {stage} 阶段失败: {str(exc)}"
             )
     
-    def _get_prompt(self, stage: str) -> str:
-        """获取提示词"""
-        if stage == "polish":
-            return get_default_polish_prompt()
-        elif stage == "emotion_polish":
-            return get_emotion_polish_prompt()
-        else:  # enhance
-            return get_default_enhance_prompt()
-    
+    @staticmethod
+    def _count_history_chars(history: List[Dict[str, str]]) -> int:
+        """统计历史消息的汉字总数"""
+        return sum(count_chinese_characters(msg.get("content", "")) for msg in history)
+
     async def _compress_history(
-        self, 
-        history: List[Dict[str, str]], 
+        self,
+        history: List[Dict[str, str]],
         stage: str
-    ) -> List[Dict[str, str]]:
+    ) -> Tuple[List[Dict[str, str]], int, bool]:
         """压缩历史会话 - 智能提取关键信息
-        
+
         压缩历史会话以减少token使用，但保留处理风格的关键特征。
         压缩后的内容单独保存，不影响已完成的润色和增强文本。
-        
+
+        返回 (压缩后的历史, 其汉字总数, 是否为压缩格式)，字符数只对压缩
+        结果统计一次，调用方据此增量维护计数，无需再遍历全部历史；
+        压缩标志直接传给 _save_history，省去事后的格式检测。
+
         如果压缩失败，返回最近的几条消息而不是抛出异常。
         """
         try:
             # 如果历史已经是压缩格式（system消息），直接返回
             if len(history) == 1 and history[0].get("role") == "system":
-                return history
+                return history, self._count_history_chars(history), True
             
             # 保留最近的2-3条消息作为风格参考
             recent_messages = history[-3:] if len(history) > 3 else history
@@ -460,53 +824,84 @@ class OptimizationService:
 
 历史处理内容："""
 
-            compressed_summary = await self.compression_service.compress_history(
-                recent_messages, 
-                compression_prompt
+            # 压缩去重：重试或恢复运行时 recent_messages 往往完全相同，
+            # 按内容哈希缓存压缩结果（内存 LRU + 响应缓存表持久化），
+            # 命中时省去一次压缩模型调用
+            cache_key = self._response_cache_key(
+                f"compress:{stage}", self.compression_service.model,
+                compression_prompt, json.dumps(recent_messages, ensure_ascii=False)
             )
-            
+            compressed_summary = self._compression_cache.get(cache_key)
+            if compressed_summary is not None:
+                self._compression_cache.move_to_end(cache_key)
+            elif settings.RESPONSE_CACHE_ENABLED:
+                compressed_summary = self._lookup_cached_response(cache_key)
+
+            if compressed_summary is not None:
+                print(f"[HISTORY COMPRESS] 命中压缩缓存，跳过压缩调用", flush=True)
+            else:
+                compressed_summary = await self.compression_service.compress_history(
+                    recent_messages,
+                    compression_prompt
+                )
+                if settings.RESPONSE_CACHE_ENABLED:
+                    self._store_cached_response(cache_key, f"compress:{stage}", compressed_summary)
+
+            self._compression_cache[cache_key] = compressed_summary
+            if len(self._compression_cache) > _COMPRESSION_CACHE_MAX:
+                self._compression_cache.popitem(last=False)
+
             # 返回压缩后的历史作为系统消息，用于后续段落的上下文参考
-            return [
+            compressed = [
                 {
                     "role": "system",
                     "content": f"之前处理的段落摘要：\n{compressed_summary}"
                 }
             ]
-            
+            return compressed, self._count_history_chars(compressed), True
+
         except Exception as e:
             # 压缩失败时，不抛出异常，而是返回最近的几条消息
             print(f"[WARNING] 历史压缩失败: {str(e)}, 将使用最近的消息代替", flush=True)
             # 返回最近的2条消息，避免上下文过长
-            return history[-2:] if len(history) > 2 else history
+            fallback = history[-2:] if len(history) > 2 else history
+            return fallback, self._count_history_chars(fallback), False
     
-    async def _save_history(self, history: List[Dict[str, str]], stage: str, char_count: int):
+    async def _save_history(self, history: List[Dict[str, str]], stage: str,
+                            char_count: int, is_compressed: bool):
         """保存历史会话 - 只在压缩后保存
-        
+
         只有压缩后的历史才保存到数据库，以避免频繁写入导致数据库膨胀。
         压缩后的内容单独保存，不影响已完成的润色和增强文本。
-        
+        压缩标志由 _compress_history 直接传入，不再通过消息格式推断。
+
         注意：未压缩的历史不会保存，因为：
         1. 润色/增强后的文本已经保存在 segments 表中
         2. 压缩只在字符数超过阈值时触发
         3. 压缩后的历史用于后续段落的上下文参考
         """
-        # 检测是否为压缩后的历史：压缩后只有一条 system 消息，包含之前处理的摘要
-        # 这种检测方式与 _compress_history 的返回格式保持一致
-        is_compressed = len(history) == 1 and history[0].get("role") == "system"
-        
         if not is_compressed:
             return  # 非压缩状态不保存，减少数据库写入
-        
+
+        # 序列化可能是数十 KB 的中文文本，放到线程池执行，
+        # 避免阻塞事件循环中并发的 LLM 调用
+        history_data = await asyncio.to_thread(json.dumps, history, ensure_ascii=False)
+
         # 检查是否已存在该阶段的压缩记录
         existing = self.db.query(SessionHistory).filter(
             SessionHistory.session_id == self.session_obj.id,
             SessionHistory.stage == stage,
             SessionHistory.is_compressed.is_(True)
         ).first()
-        
+
         if existing:
+            # 内容未变化时跳过写入（压缩缓存命中时常见），
+            # 避免把几十 KB 的相同快照再写一遍
+            if existing.history_data == history_data:
+                return
+
             # 更新现有记录
-            existing.history_data = json.dumps(history, ensure_ascii=False)
+            existing.history_data = history_data
             existing.character_count = char_count
             existing.created_at = datetime.utcnow()
         else:
@@ -514,12 +909,12 @@ class OptimizationService:
             history_obj = SessionHistory(
                 session_id=self.session_obj.id,
                 stage=stage,
-                history_data=json.dumps(history, ensure_ascii=False),
+                history_data=history_data,
                 is_compressed=True,
                 character_count=char_count
             )
             self.db.add(history_obj)
-        
+
         self.db.commit()
     
     async def _record_change(
@@ -537,11 +932,8 @@ class OptimizationService:
             "changed": before != after
         }
         
-        existing_log = self.db.query(ChangeLog).filter(
-            ChangeLog.session_id == self.session_obj.id,
-            ChangeLog.segment_index == segment.segment_index,
-            ChangeLog.stage == stage
-        ).order_by(ChangeLog.created_at.desc()).first()
+        # 从预加载缓存中查找，避免每段落一次的数据库查询
+        existing_log = self._change_log_cache.get((segment.segment_index, stage))
 
         serialized_detail = json.dumps(changes, ensure_ascii=False)
 
@@ -560,4 +952,5 @@ class OptimizationService:
                 changes_detail=serialized_detail
             )
             self.db.add(change_log)
-        self.db.commit()
+            self._change_log_cache[(segment.segment_index, stage)] = change_log
+        # 提交由调用方负责，与段落输出合并为一次事务
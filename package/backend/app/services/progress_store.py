@@ -0,0 +1,110 @@
+import asyncio
+from typing import Dict, Optional
+
+from app.config import settings
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    aioredis = None
+    REDIS_AVAILABLE = False
+
+# 进度键的过期时间（秒），避免中断的会话在 Redis 中残留
+PROGRESS_TTL_SECONDS = 3600
+
+
+class ProgressStore:
+    """会话进度存储（Redis 优先，数据库兜底）
+
+    进度/当前位置只服务于前端轮询，逐段落写数据库会在长文档运行时
+    产生最大的写入压力（每段一次 fsync）。把逐段更新改写到 Redis，
+    数据库只在阶段边界和失败路径落盘。
+
+    Redis 不可用时（未配置、连接失败）自动降级为 no-op，
+    调用方继续走原有的数据库路径，不影响功能。
+    """
+
+    def __init__(self):
+        self._client = None
+        self._unavailable = not REDIS_AVAILABLE
+        self._lock = asyncio.Lock()
+
+    @property
+    def available(self) -> bool:
+        """Redis 是否可用（懒连接，首次失败后不再重试）"""
+        return not self._unavailable
+
+    async def _get_client(self):
+        """懒初始化 Redis 客户端，连接失败则永久降级"""
+        if self._unavailable:
+            return None
+        if self._client is not None:
+            return self._client
+        async with self._lock:
+            if self._client is not None or self._unavailable:
+                return self._client
+            try:
+                client = aioredis.from_url(
+                    settings.REDIS_URL,
+                    decode_responses=True,
+                    socket_connect_timeout=2,
+                    socket_timeout=2
+                )
+                await client.ping()
+                self._client = client
+                print("[PROGRESS] Redis 进度存储已启用", flush=True)
+            except Exception as e:
+                self._unavailable = True
+                print(f"[PROGRESS] Redis 不可用，进度回退到数据库: {e}", flush=True)
+        return self._client
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"sess:{session_id}:progress"
+
+    async def set_progress(self, session_id: str, progress: float,
+                           position: int, stage: str, status: str = "processing") -> bool:
+        """写入会话进度，返回是否写入成功（失败时调用方应走数据库）"""
+        client = await self._get_client()
+        if client is None:
+            return False
+        try:
+            key = self._key(session_id)
+            await client.hset(key, mapping={
+                "progress": progress,
+                "pos": position,
+                "stage": stage,
+                "status": status,
+            })
+            await client.expire(key, PROGRESS_TTL_SECONDS)
+            return True
+        except Exception as e:
+            print(f"[PROGRESS] Redis 写入失败，降级到数据库: {e}", flush=True)
+            self._unavailable = True
+            return False
+
+    async def get_progress(self, session_id: str) -> Optional[Dict[str, str]]:
+        """读取会话进度，Redis 无数据或不可用时返回 None"""
+        client = await self._get_client()
+        if client is None:
+            return None
+        try:
+            data = await client.hgetall(self._key(session_id))
+            return data or None
+        except Exception:
+            return None
+
+    async def clear(self, session_id: str):
+        """会话结束后清理进度键"""
+        client = await self._get_client()
+        if client is None:
+            return
+        try:
+            await client.delete(self._key(session_id))
+        except Exception:
+            pass
+
+
+# 全局实例
+progress_store = ProgressStore()
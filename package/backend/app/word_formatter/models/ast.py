@@ -3,11 +3,19 @@ DocumentAST: 结构化内容表示（确定性编译输入）。
 """
 from __future__ import annotations
 
+from functools import cached_property
 from typing import Any, Dict, List, Literal, Optional, Union
 
 from pydantic import BaseModel, Field, field_validator
 
 
+# 前置标题名（小写）：摘要/关键词/目录/参考文献等非正文章节标题
+FRONT_HEADING_NAMES = frozenset({
+    "摘要", "关键词", "关键字", "abstract", "key words", "keywords",
+    "致谢", "谢辞", "参考文献", "references", "目录", "目 录",
+})
+
+
 InlineType = Literal["text", "bold", "italic", "underline", "superscript", "subscript", "code"]
 
 
@@ -46,6 +54,18 @@ class ParagraphBlock(BaseModel):
         # allow None if inlines provided
         return v
 
+    @cached_property
+    def materialized_text(self) -> str:
+        """段落的纯文本形式，inlines 只拼接一次并缓存。
+
+        同一 AST 被多次渲染（模板化场景）时避免每次渲染都重新 join。
+        """
+        if self.text is not None:
+            return self.text
+        if self.inlines:
+            return "".join(i.text for i in self.inlines)
+        return ""
+
 
 class CodeBlock(BaseModel):
     """代码块，用于表示 Markdown 中的 fenced code block。"""
@@ -116,3 +136,19 @@ class DocumentMeta(BaseModel):
 class DocumentAST(BaseModel):
     meta: DocumentMeta = Field(default_factory=DocumentMeta)
     blocks: List[Block]
+
+    @cached_property
+    def min_body_heading_level(self) -> Optional[int]:
+        """正文标题（排除前置标题）中的最小级别，只遍历一次并缓存。
+
+        渲染器用它把 "## 当一级标题" 这类文档的级别归一化为从 1 开始。
+        没有正文标题时返回 None。
+        """
+        min_level = None
+        for block in self.blocks:
+            if isinstance(block, HeadingBlock):
+                if block.text.strip().lower() in FRONT_HEADING_NAMES:
+                    continue
+                if min_level is None or block.level < min_level:
+                    min_level = block.level
+        return min_level
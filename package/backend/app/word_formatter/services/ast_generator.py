@@ -485,6 +485,9 @@ def _merge_bibliography_blocks(blocks: List[Any]) -> List[Any]:
 
 _HEADING_NUM_RE = re.compile(r"^\s*(\d+)([\.．](\d+))*([\.．](\d+))*\s+(.+)$")
 
+# 全角点折算为半角后只数一次，省掉对编号前缀的第二遍扫描
+_DOT_TRANS = str.maketrans("．", ".")
+
 
 def parse_plaintext_heuristic(text: str) -> DocumentAST:
     """
@@ -521,10 +524,11 @@ def parse_plaintext_heuristic(text: str) -> DocumentAST:
         if m:
             flush_para()
             # count levels by number of separators
-            prefix = line.split()[0]
-            sep_count = prefix.count(".") + prefix.count("．")
+            parts = line.split(None, 1)
+            prefix = parts[0]
+            sep_count = prefix.translate(_DOT_TRANS).count(".")
             level = min(1 + sep_count, 3)
-            title = line.split(None, 1)[1].strip() if len(line.split(None, 1)) > 1 else line.strip()
+            title = parts[1].strip() if len(parts) > 1 else line.strip()
             blocks.append(HeadingBlock(level=level, text=title))
         else:
             para_buf.append(line)
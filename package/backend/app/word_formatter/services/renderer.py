@@ -4,19 +4,21 @@
 from __future__ import annotations
 
 import io
-import os
 import re
+from copy import deepcopy
 from dataclasses import dataclass
 from typing import Optional, Set
+from xml.sax.saxutils import escape
 
 from docx import Document
 from docx.enum.section import WD_SECTION
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml import OxmlElement
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
 from docx.oxml.ns import qn
 from docx.shared import Mm
+from lxml import etree
 
 from ..models.ast import (
+    FRONT_HEADING_NAMES,
     BibliographyBlock,
     CodeBlock,
     DocumentAST,
@@ -109,36 +111,110 @@ class RenderOptions:
     toc_levels: int = 3
 
 
-_FRONT_HEADINGS: Set[str] = {
-    "摘要", "关键词", "关键字", "abstract", "key words", "keywords",
-    "致谢", "谢辞", "参考文献", "references", "目录", "目 录",
-}
+# 热循环中使用的正则统一在模块加载时编译一次，
+# 避免逐块渲染时重复走 re 模块的编译缓存查找
+_TABLE_NUM_RE = re.compile(r"^表\d+")
+_FIG_NUM_RE = re.compile(r"^图\d+")
+_CN_KW_SPLIT = re.compile(r"[，,;；\s]+")
+_EN_KW_SPLIT = re.compile(r"[;；,，]+")
+
+# 渲染过程会用到的全部样式名；python-docx 的 Styles 下标访问每次都要
+# 遍历样式表，渲染前一次性取出为普通 dict，热循环中用 dict.get
+_STYLE_NAMES = (
+    "Body", "H1", "H2", "H3", "FrontHeading", "AbstractBody", "KeywordsBody",
+    "Reference", "ListNumber", "ListBullet", "TableTitle", "TableText",
+    "CodeBlock", "FigureCaption", "PageNumber", "TitleCN", "TitleEN", "MetaLine",
+)
+
+
+def _build_style_map(doc: Document) -> dict:
+    """把渲染用到的样式一次性取出为 name -> style 映射。"""
+    return {name: doc.styles[name] for name in _STYLE_NAMES if name in doc.styles}
+
+
+# 集合内容全部为小写，调用方统一传入 text.lower() 后做单次成员测试
+# （定义在 AST 层，min_body_heading_level 缓存属性也依赖它）
+_FRONT_HEADINGS: Set[str] = FRONT_HEADING_NAMES
 
-_FRONT_ONLY_HEADINGS: Set[str] = {
+_FRONT_ONLY_HEADINGS: Set[str] = frozenset({
     "摘要", "关键词", "关键字", "abstract", "key words", "keywords",
-}
+})
+
+# 标题层级（1-3）到样式 ID 的查表，替代 if/elif 级联
+_H_STYLES = ("H1", "H2", "H3")
+
+
+def _insert_page_break_before(leader) -> None:
+    """在 leader 哨兵段落之前插入分页段落（等价于 doc.add_page_break）。"""
+    p = leader.insert_paragraph_before()
+    p.add_run().add_break(WD_BREAK.PAGE)
+
+
+def _move_body_tail_before(leader) -> None:
+    """把刚追加到文档主体末尾的元素移动到 leader 哨兵段落之前。
+
+    表格/图片/分节等 python-docx API 只能在主体末尾追加，
+    渲染主循环统一以 leader 为插入点，追加后立即移动以保持块顺序。
+    """
+    el = leader._p.getnext()
+    if el is not None:
+        leader._p.addprevious(el)
+
+
+# 参考文献条目达到该数量时改用整块 XML 构建（短列表不值得绕过对象层）
+_BULK_BIB_THRESHOLD = 20
+
+
+def _insert_bibliography_bulk(leader, items, reference_style) -> None:
+    """把参考文献条目拼成一段 XML 字符串一次解析后插入 leader 之前。
+
+    逐条 insert_paragraph_before + 赋样式要为每条走一遍 python-docx 的
+    段落/run/样式对象层；长列表下直接生成与其输出等价的 OOXML 更快。
+    """
+    style_id = reference_style.style_id if reference_style is not None else None
+    ppr = f'<w:pPr><w:pStyle w:val="{escape(style_id)}"/></w:pPr>' if style_id else ""
+    parts = []
+    for it in items:
+        if it:
+            # 与 CT_R.add_t 一致：只有带前后空白的文本才需要 xml:space
+            space = ' xml:space="preserve"' if len(it.strip()) < len(it) else ""
+            parts.append(f"<w:p>{ppr}<w:r><w:t{space}>{escape(it)}</w:t></w:r></w:p>")
+        else:
+            parts.append(f"<w:p>{ppr}</w:p>")
+    frag = etree.fromstring(f'<root xmlns:w="{_W_NS}">{"".join(parts)}</root>')
+    for el in list(frag):
+        leader._p.addprevious(el)
 
 
 def _is_front_heading(text: str) -> bool:
     """检查是否为前置标题（不区分大小写）。"""
-    return text.lower() in _FRONT_HEADINGS or text in _FRONT_HEADINGS
+    return text.lower() in _FRONT_HEADINGS
 
 
 def _is_front_only_heading(text: str) -> bool:
     """检查是否为仅前置标题（不区分大小写）。"""
-    return text.lower() in _FRONT_ONLY_HEADINGS or text in _FRONT_ONLY_HEADINGS
+    return text.lower() in _FRONT_ONLY_HEADINGS
+
+
+# sectPr 只会出现在段落属性内（分节符）或主体末尾（最后一节），
+# 预编译 XPath 精确命中这两种位置，避免 findall(".//w:sectPr") 全树扫描
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_SECT_PR_XPATH = etree.XPath(
+    "./w:p/w:pPr/w:sectPr | ./w:sectPr", namespaces={"w": _W_NS}
+)
+
 
+def _apply_page_numbering_ooxml(doc: Document, spec: StyleSpec) -> None:
+    """Set section-based page numbering format/start using OOXML.
 
-def _apply_page_numbering_ooxml(docx_bytes: bytes, spec: StyleSpec) -> bytes:
-    """Set section-based page numbering format/start using OOXML."""
+    直接在内存中的 lxml 树（doc.element.body）上修改，
+    避免 保存→解包→改 XML→重打包 的字节往返。
+    """
     pn = spec.page_numbering
     if not pn or not pn.enabled:
-        return docx_bytes
-    from ..utils.ooxml import DocxPackage
-    from lxml import etree
+        return
 
-    W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
-    NSMAP = {"w": W_NS}
+    NSMAP = {"w": _W_NS}
 
     def _qn(tag: str) -> str:
         pref, local = tag.split(":")
@@ -150,23 +226,11 @@ def _apply_page_numbering_ooxml(docx_bytes: bytes, spec: StyleSpec) -> bytes:
         "romanLower": "lowerRoman",
     }
 
-    pkg = DocxPackage.from_bytes(docx_bytes)
-    root = pkg.read_xml("word/document.xml")
-    body = root.find("w:body", namespaces=NSMAP)
-    if body is None:
-        return docx_bytes
-
-    sect_prs = body.findall(".//w:sectPr", namespaces=NSMAP)
-    seen = set()
-    ordered = []
-    for s in sect_prs:
-        sid = id(s)
-        if sid in seen:
-            continue
-        seen.add(sid)
-        ordered.append(s)
+    body = doc.element.body
+    # XPath 联合按文档顺序返回且无重复，不再需要 id() 去重
+    ordered = _SECT_PR_XPATH(body)
     if not ordered:
-        return docx_bytes
+        return
 
     def _set_pgnum(sectPr, fmt: str, start: int):
         pg = sectPr.find("w:pgNumType", namespaces=NSMAP)
@@ -181,51 +245,173 @@ def _apply_page_numbering_ooxml(docx_bytes: bytes, spec: StyleSpec) -> bytes:
         _set_pgnum(ordered[0], pn.front_format, pn.front_start)
         _set_pgnum(ordered[-1], pn.main_format, pn.main_start)
 
-    pkg.write_xml("word/document.xml", root)
-    return pkg.to_bytes()
 
-
-def _insert_toc_paragraph(doc: Document, title: str, front_style: str, max_level: int):
+def _insert_toc_paragraph(doc: Document, title: str, front_style: str, max_level: int, styles: dict):
     doc.add_paragraph("")
     doc.add_paragraph("")
     p = doc.add_paragraph(title)
-    if front_style in doc.styles:
-        p.style = doc.styles[front_style]
+    style = styles.get(front_style)
+    if style is not None:
+        p.style = style
     p2 = doc.add_paragraph()
     run = p2.add_run()
-    fld = OxmlElement("w:fldSimple")
+    fld = deepcopy(_TOC_FLD_TEMPLATE)
     fld.set(qn("w:instr"), f'TOC \\o "1-{max_level}" \\h \\z \\u')
     run._r.append(fld)
     run2 = p2.add_run("（在 Word 中右键目录 → 更新域）")
 
 
-def _detect_heading_level_offset(ast: DocumentAST) -> int:
-    """检测标题级别偏移量。
+def _fill_table_cells_bulk(table, rows, cols: int, table_text_style) -> None:
+    """纯文本表格：整表拼 <w:tr>/<w:tc> XML 一次解析后替换默认行。
 
-    如果文档中最小的标题级别不是 1（例如用户用 ## 作为一级标题），
-    计算需要减去的偏移量，使其归一化为从 1 开始。
+    逐格经过 python-docx 的单元格/段落/样式对象层要 R·C 次往返；
+    单元格内容相互独立，样式与居中直接烘焙进 pPr，一次解析装入，
+    输出与逐格路径一致。
+    """
+    tbl = table._tbl
+    grid = tbl.find(qn("w:tblGrid"))
+    col_w = grid[0].get(qn("w:w")) if grid is not None and len(grid) else "0"
+    sid = table_text_style.style_id if table_text_style is not None else None
+    pstyle = f'<w:pStyle w:val="{escape(sid)}"/>' if sid else ""
+    tc_prefix = (
+        f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{col_w}"/></w:tcPr>'
+        f'<w:p><w:pPr>{pstyle}<w:jc w:val="center"/></w:pPr>'
+    )
+    parts = []
+    for row in rows:
+        parts.append("<w:tr>")
+        for c_i in range(cols):
+            text = row[c_i] if c_i < len(row) else ""
+            if text:
+                # 与 CT_R.add_t 一致：只有带前后空白的文本才需要 xml:space
+                space = ' xml:space="preserve"' if len(text.strip()) < len(text) else ""
+                run = f"<w:r><w:t{space}>{escape(text)}</w:t></w:r>"
+            else:
+                run = "<w:r/>"
+            parts.append(f"{tc_prefix}{run}</w:p></w:tc>")
+        parts.append("</w:tr>")
+    frag = etree.fromstring(f'<root xmlns:w="{_W_NS}">{"".join(parts)}</root>')
+    for tr in tbl.findall(qn("w:tr")):
+        tbl.remove(tr)
+    for tr in list(frag):
+        tbl.append(tr)
+
+
+def _render_blocks_fast(ast: DocumentAST, spec: StyleSpec, styles: dict, leader) -> bool:
+    """纯段落类文档的快速路径：整篇拼 OOXML 字符串后一次解析插入。
+
+    典型论文正文（标题/段落/分页/参考文献，段落均为纯文本）下，
+    逐块构建 python-docx 对象图是渲染的主要开销——每个段落要生成
+    一串 lxml 元素和包装对象。把全部块先拼成 XML 字符串、只做一次
+    etree.fromstring 再整体插到 leader 之前，分配量低得多。
+    状态机（前置章节识别、摘要/关键词前缀、级别归一化）与普通
+    路径保持一致；含表格/图片/富文本或需要分节页码时返回 False
+    走普通路径。
+    """
+    for b in ast.blocks:
+        if isinstance(b, (HeadingBlock, PageBreakBlock, BibliographyBlock)):
+            continue
+        if isinstance(b, ParagraphBlock) and not b.inlines:
+            continue
+        return False
+
+    def _sid(style) -> Optional[str]:
+        return style.style_id if style is not None else None
+
+    def _p_xml(style_id: Optional[str], text: str) -> str:
+        ppr = f'<w:pPr><w:pStyle w:val="{escape(style_id)}"/></w:pPr>' if style_id else ""
+        if text:
+            # 与 CT_R.add_t 一致：只有带前后空白的文本才需要 xml:space
+            space = ' xml:space="preserve"' if len(text.strip()) < len(text) else ""
+            return f"<w:p>{ppr}<w:r><w:t{space}>{escape(text)}</w:t></w:r></w:p>"
+        return f"<w:p>{ppr}</w:p>"
+
+    min_body_level = ast.min_body_heading_level
+    heading_level_offset = (
+        min_body_level - 1 if min_body_level is not None and min_body_level > 1 else 0
+    )
+    auto_prefix = spec.auto_prefix_abstract_keywords
+    body_sid = _sid(styles.get("Body"))
+    reference_sid = _sid(styles.get("Reference"))
 
-    Args:
-        ast: 文档 AST
+    current_section = None
+    abstract_prefixed = False
+    keywords_prefixed = False
+    parts = []
 
-    Returns:
-        偏移量（0 表示无需调整，1 表示所有级别减 1，以此类推）
-    """
-    min_level = None
     for block in ast.blocks:
         if isinstance(block, HeadingBlock):
-            # 跳过前置标题（摘要、Abstract 等通常是单独设置的）
-            heading_text = block.text.strip().lower()
-            if heading_text in _FRONT_HEADINGS:
+            heading_text = block.text.strip()
+            heading_lower = heading_text.lower()
+
+            if heading_lower == "摘要":
+                current_section = "cn_abstract"
+            elif heading_lower in ("关键词", "关键字"):
+                current_section = "cn_keywords"
+            elif heading_lower == "abstract":
+                current_section = "en_abstract"
+            elif heading_lower in ("key words", "keywords"):
+                current_section = "en_keywords"
+            elif heading_lower in ("参考文献", "references"):
+                current_section = "references"
+            else:
+                current_section = "body"
+
+            if heading_lower in _FRONT_HEADINGS:
+                style_id = "FrontHeading"
+            else:
+                effective_level = min(max(1, block.level - heading_level_offset), 3)
+                style_id = _H_STYLES[effective_level - 1]
+            sid = _sid(styles.get(style_id)) or body_sid
+            parts.append(_p_xml(sid, heading_text))
+            continue
+
+        if isinstance(block, ParagraphBlock):
+            raw_text = block.materialized_text
+            if not raw_text.strip():
                 continue
-            if min_level is None or block.level < min_level:
-                min_level = block.level
 
-    # 如果没有正文标题或最小级别已是 1，无需调整
-    if min_level is None or min_level <= 1:
-        return 0
+            if auto_prefix:
+                if current_section == "cn_abstract" and not abstract_prefixed:
+                    if not raw_text.startswith("摘要："):
+                        raw_text = "摘要：" + raw_text
+                    abstract_prefixed = True
+                elif current_section == "en_abstract" and not abstract_prefixed:
+                    if not raw_text.lower().startswith("abstract:"):
+                        raw_text = "Abstract: " + raw_text
+                    abstract_prefixed = True
+                elif current_section in {"cn_keywords", "en_keywords"} and not keywords_prefixed:
+                    if current_section == "cn_keywords" and not raw_text.startswith(("关键词：", "关键字：")):
+                        raw_text = "关键词：" + _normalize_cn_keywords(raw_text)
+                    elif current_section == "en_keywords" and not raw_text.lower().startswith(("key words:", "keywords:")):
+                        raw_text = "Key words: " + _normalize_en_keywords(raw_text)
+                    keywords_prefixed = True
+
+            style_id = "Body"
+            if current_section in {"cn_abstract", "en_abstract"}:
+                style_id = "AbstractBody"
+            elif current_section in {"cn_keywords", "en_keywords"}:
+                style_id = "KeywordsBody"
+            elif current_section == "references":
+                style_id = "Reference"
+
+            parts.append(_p_xml(_sid(styles.get(style_id)), raw_text))
+            continue
+
+        if isinstance(block, PageBreakBlock):
+            parts.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+            continue
+
+        if isinstance(block, BibliographyBlock):
+            for it in block.items:
+                parts.append(_p_xml(reference_sid, it))
+            continue
 
-    return min_level - 1
+    if parts:
+        frag = etree.fromstring(f'<root xmlns:w="{_W_NS}">{"".join(parts)}</root>')
+        for el in list(frag):
+            leader._p.addprevious(el)
+    return True
 
 
 def render_docx(
@@ -236,6 +422,7 @@ def render_docx(
 ) -> bytes:
     options = options or RenderOptions()
     doc = Document(io.BytesIO(reference_docx_bytes))
+    styles = _build_style_map(doc)
 
     section = doc.sections[0]
     section.top_margin = Mm(spec.page.margins_mm.top)
@@ -253,12 +440,12 @@ def render_docx(
 
     # Cover
     if options.include_cover:
-        _render_cover(doc, ast)
+        _render_cover(doc, ast, styles)
         doc.add_page_break()
 
     # TOC
     if options.include_toc:
-        _insert_toc_paragraph(doc, options.toc_title, "FrontHeading", spec.structure.toc_max_level)
+        _insert_toc_paragraph(doc, options.toc_title, "FrontHeading", spec.structure.toc_max_level, styles)
         doc.add_page_break()
 
     need_page_numbering = bool(spec.page_numbering and spec.page_numbering.enabled)
@@ -270,22 +457,58 @@ def render_docx(
     fig_counter = 0
     table_counter = 0
 
-    # 检测标题级别偏移（支持 ## 作为一级标题等情况）
-    heading_level_offset = _detect_heading_level_offset(ast)
-
-    for block in ast.blocks:
+    # 标题级别偏移（支持 ## 作为一级标题等情况），
+    # 最小正文标题级别由 AST 缓存属性提供，不再在渲染前单独遍历全部块
+    min_body_level = ast.min_body_heading_level
+    heading_level_offset = (
+        min_body_level - 1 if min_body_level is not None and min_body_level > 1 else 0
+    )
+
+    # python-docx 的 add_paragraph/add_table 每次都线性扫描主体子节点
+    # 定位末尾的 sectPr，长文档整体退化为 O(N²)。改为在主体末尾放一个
+    # leader 哨兵段落，所有块用 insert_paragraph_before 以 O(1) 插入到
+    # 它前面（只能末尾追加的 API 追加后立即移动），保存前移除哨兵。
+    leader = doc.add_paragraph()
+
+    # 循环不变量提前取出，避免每个块都重复做属性链访问和样式表查找
+    auto_prefix = spec.auto_prefix_abstract_keywords
+    auto_number = spec.auto_number_figures_tables
+    center_align = WD_ALIGN_PARAGRAPH.CENTER
+    body_style = styles.get("Body")
+    reference_style = styles.get("Reference")
+    table_title_style = styles.get("TableTitle")
+    table_text_style = styles.get("TableText")
+    code_style = styles.get("CodeBlock")
+    figure_caption_style = styles.get("FigureCaption")
+    list_number_style = styles.get("ListNumber")
+    list_bullet_style = styles.get("ListBullet")
+
+    # doc.paragraphs 每次访问都要遍历主体子节点，改为用布尔量跟踪
+    # “是否已输出过正文段落”（leader 哨兵算一个，所以初值以 > 1 判断）
+    any_paragraph_yet = len(doc.paragraphs) > 1
+
+    # 同一图片被多次引用时只读一次磁盘；读失败缓存 None，走占位段落
+    image_cache: dict = {}
+
+    # 纯段落类文档整篇拼 XML 一次解析；需要分节页码时不适用
+    # （主体分节要借助 add_section 克隆 sectPr，无法纯字符串表达）
+    fast_done = not need_page_numbering and _render_blocks_fast(ast, spec, styles, leader)
+
+    for block in () if fast_done else ast.blocks:
         if isinstance(block, HeadingBlock):
             heading_text = block.text.strip()
+            # 每个标题只做一次小写转换，后续比较与成员测试全部复用
+            heading_lower = heading_text.lower()
 
-            if heading_text in {"摘要"}:
+            if heading_lower == "摘要":
                 current_section = "cn_abstract"
-            elif heading_text in {"关键词", "关键字"}:
+            elif heading_lower in ("关键词", "关键字"):
                 current_section = "cn_keywords"
-            elif heading_text.lower() == "abstract":
+            elif heading_lower == "abstract":
                 current_section = "en_abstract"
-            elif heading_text.lower() in {"key words", "keywords"}:
+            elif heading_lower in ("key words", "keywords"):
                 current_section = "en_keywords"
-            elif heading_text.lower() in {"参考文献", "references"}:
+            elif heading_lower in ("参考文献", "references"):
                 current_section = "references"
             else:
                 current_section = "body"
@@ -293,53 +516,43 @@ def render_docx(
             if (
                 need_page_numbering
                 and not main_section_inserted
-                and not _is_front_only_heading(heading_text)
-                and len(doc.paragraphs) > 0
+                and heading_lower not in _FRONT_ONLY_HEADINGS
+                and any_paragraph_yet
             ):
                 doc.add_section(WD_SECTION.NEW_PAGE)
+                _move_body_tail_before(leader)
                 main_section_inserted = True
 
-            if _is_front_heading(heading_text):
+            if heading_lower in _FRONT_HEADINGS:
                 style_id = "FrontHeading"
                 display_text = heading_text
             else:
-                # 应用级别偏移（支持 ## 作为一级标题等情况）
-                effective_level = max(1, block.level - heading_level_offset)
-
-                # 限制最大层级为 3（模板通常只支持 H1-H3）
-                effective_level = min(effective_level, 3)
-
-                if effective_level == 1:
-                    style_id = "H1"
-                elif effective_level == 2:
-                    style_id = "H2"
-                elif effective_level == 3:
-                    style_id = "H3"
-                else:
-                    style_id = "H3"
+                # 应用级别偏移（支持 ## 作为一级标题等情况），
+                # 并限制最大层级为 3（模板通常只支持 H1-H3）
+                effective_level = min(max(1, block.level - heading_level_offset), 3)
+                style_id = _H_STYLES[effective_level - 1]
 
                 # 直接使用原始标题文本，不添加编号
                 display_text = heading_text
 
-            p = doc.add_paragraph(display_text)
-            if style_id in doc.styles:
-                p.style = doc.styles[style_id]
-            elif "Body" in doc.styles:
-                p.style = doc.styles["Body"]
+            p = leader.insert_paragraph_before(display_text)
+            any_paragraph_yet = True
+            style = styles.get(style_id) or styles.get("Body")
+            if style is not None:
+                p.style = style
             # 清除 Word 样式可能关联的自动编号
             _clear_paragraph_numbering(p)
             continue
 
         if isinstance(block, ParagraphBlock):
             inlines = block.inlines
-            raw_text = block.text
-            if raw_text is None and inlines:
-                raw_text = "".join(i.text for i in inlines)
-            if not (raw_text or "").strip():
+            # 纯文本形式由 AST 缓存，重复渲染同一 AST 时不再逐次拼接
+            raw_text = block.materialized_text
+            if not raw_text.strip():
                 continue
 
             # 处理摘要/关键词前缀
-            if spec.auto_prefix_abstract_keywords:
+            if auto_prefix:
                 if current_section == "cn_abstract" and not abstract_prefixed:
                     if not (raw_text or "").startswith("摘要："):
                         if inlines:
@@ -375,9 +588,11 @@ def render_docx(
             elif current_section == "references":
                 style_id = "Reference"
 
-            p = doc.add_paragraph()
-            if style_id in doc.styles:
-                p.style = doc.styles[style_id]
+            p = leader.insert_paragraph_before()
+            any_paragraph_yet = True
+            style = styles.get(style_id)
+            if style is not None:
+                p.style = style
             # 优先使用富文本渲染
             if inlines:
                 _apply_inlines(p, inlines)
@@ -386,21 +601,21 @@ def render_docx(
             continue
 
         if isinstance(block, ListBlock):
-            style_name = "ListNumber" if block.ordered else "ListBullet"
-            use_style = style_name in doc.styles
+            list_style = list_number_style if block.ordered else list_bullet_style
             for idx, item in enumerate(block.items, start=1):
                 raw_text = "".join(i.text for i in item.inlines)
                 if not raw_text.strip():
                     continue
-                if use_style:
-                    p = doc.add_paragraph()
-                    p.style = doc.styles[style_name]
+                any_paragraph_yet = True
+                if list_style is not None:
+                    p = leader.insert_paragraph_before()
+                    p.style = list_style
                     _apply_inlines(p, item.inlines)
                 else:
                     prefix = f"{idx}. " if block.ordered else "• "
-                    p = doc.add_paragraph()
-                    if "Body" in doc.styles:
-                        p.style = doc.styles["Body"]
+                    p = leader.insert_paragraph_before()
+                    if body_style is not None:
+                        p.style = body_style
                     p.add_run(prefix)
                     _apply_inlines(p, item.inlines)
             continue
@@ -408,60 +623,71 @@ def render_docx(
         if isinstance(block, TableBlock):
             if block.caption:
                 caption = block.caption.strip()
-                if spec.auto_number_figures_tables and not re.match(r"^表\d+", caption):
+                if auto_number and not _TABLE_NUM_RE.match(caption):
                     table_counter += 1
                     caption = f"表{table_counter} {caption}"
-                pcap = doc.add_paragraph(caption)
-                if "TableTitle" in doc.styles:
-                    pcap.style = doc.styles["TableTitle"]
-            elif spec.auto_number_figures_tables:
+                pcap = leader.insert_paragraph_before(caption)
+                any_paragraph_yet = True
+                if table_title_style is not None:
+                    pcap.style = table_title_style
+            elif auto_number:
                 table_counter += 1
-                pcap = doc.add_paragraph(f"表{table_counter}")
-                if "TableTitle" in doc.styles:
-                    pcap.style = doc.styles["TableTitle"]
+                pcap = leader.insert_paragraph_before(f"表{table_counter}")
+                any_paragraph_yet = True
+                if table_title_style is not None:
+                    pcap.style = table_title_style
             if not block.rows:
                 continue
             # 使用富文本列或纯文本列来计算列数
             rows_for_cols = block.rows_inlines if block.rows_inlines else block.rows
             cols = max(len(r) for r in rows_for_cols)
             table = doc.add_table(rows=len(block.rows), cols=cols)
-            for r_i, row in enumerate(block.rows):
-                for c_i in range(cols):
-                    cell = table.cell(r_i, c_i)
-                    # 优先使用富文本渲染
-                    cell_inlines = None
-                    if block.rows_inlines and r_i < len(block.rows_inlines):
-                        if c_i < len(block.rows_inlines[r_i]):
+            _move_body_tail_before(leader)
+            if block.rows_inlines:
+                # 富文本表格保留对象层路径
+                # table.cell(r, c) 每次都要遍历整个网格定位，大表格下是
+                # O(R²C²)；一次性取出按行展开的单元格列表后直接下标
+                cells = table._cells
+                for r_i, row in enumerate(block.rows):
+                    for c_i in range(cols):
+                        cell = cells[r_i * cols + c_i]
+                        # 优先使用富文本渲染
+                        cell_inlines = None
+                        if r_i < len(block.rows_inlines) and c_i < len(block.rows_inlines[r_i]):
                             cell_inlines = block.rows_inlines[r_i][c_i]
-                    cell_text = row[c_i] if c_i < len(row) else ""
-                    p = cell.paragraphs[0] if cell.paragraphs else cell.add_paragraph()
-                    _clear_paragraph_runs(p)
-                    if cell_inlines:
-                        _apply_inlines(p, cell_inlines)
-                    else:
-                        p.add_run(cell_text)
-                    if "TableText" in doc.styles:
-                        p.style = doc.styles["TableText"]
-                    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                        cell_text = row[c_i] if c_i < len(row) else ""
+                        # add_table 生成的单元格恒含一个段落，取首个即可，
+                        # 不必为判空把子节点再遍历一遍
+                        p = cell.paragraphs[0]
+                        _clear_paragraph_runs(p)
+                        if cell_inlines:
+                            _apply_inlines(p, cell_inlines)
+                        else:
+                            p.add_run(cell_text)
+                        if table_text_style is not None:
+                            p.style = table_text_style
+                        p.alignment = center_align
+            else:
+                _fill_table_cells_bulk(table, block.rows, cols, table_text_style)
             _apply_three_line_table(table)
             continue
 
         if isinstance(block, CodeBlock):
             # 处理代码块
-            p = doc.add_paragraph()
-            if "CodeBlock" in doc.styles:
-                p.style = doc.styles["CodeBlock"]
-            elif "Body" in doc.styles:
-                p.style = doc.styles["Body"]
+            p = leader.insert_paragraph_before()
+            any_paragraph_yet = True
+            effective_code_style = code_style or body_style
+            if effective_code_style is not None:
+                p.style = effective_code_style
 
             # 特殊处理 Mermaid 流程图
             if block.language and block.language.lower() == "mermaid":
                 placeholder_run = p.add_run("[流程图占位：mermaid]")
                 placeholder_run.italic = True
                 # 添加代码内容作为参考
-                p2 = doc.add_paragraph()
-                if "CodeBlock" in doc.styles:
-                    p2.style = doc.styles["CodeBlock"]
+                p2 = leader.insert_paragraph_before()
+                if code_style is not None:
+                    p2.style = code_style
                 code_run = p2.add_run(block.text or "")
                 code_run.font.name = "Consolas"
             else:
@@ -471,59 +697,82 @@ def render_docx(
             continue
 
         if isinstance(block, FigureBlock):
-            if spec.auto_number_figures_tables and block.caption and not re.match(r"^图\d+", block.caption.strip()):
+            if auto_number and block.caption and not _FIG_NUM_RE.match(block.caption.strip()):
                 fig_counter += 1
                 caption = f"图{fig_counter} {block.caption.strip()}"
             else:
                 caption = block.caption
-            if os.path.exists(block.path):
-                doc.add_picture(block.path)
+            if block.path in image_cache:
+                image_data = image_cache[block.path]
+            else:
+                # 直接尝试读取，避免 exists + open 的两次文件系统访问
+                try:
+                    with open(block.path, "rb") as f:
+                        image_data = f.read()
+                except OSError:
+                    image_data = None
+                image_cache[block.path] = image_data
+            if image_data is not None:
+                doc.add_picture(io.BytesIO(image_data))
+                _move_body_tail_before(leader)
             else:
-                p = doc.add_paragraph(f"[图片占位：{block.path}]")
-                if "Body" in doc.styles:
-                    p.style = doc.styles["Body"]
+                p = leader.insert_paragraph_before(f"[图片占位：{block.path}]")
+                if body_style is not None:
+                    p.style = body_style
             if caption:
-                pcap = doc.add_paragraph(caption)
-                if "FigureCaption" in doc.styles:
-                    pcap.style = doc.styles["FigureCaption"]
+                pcap = leader.insert_paragraph_before(caption)
+                if figure_caption_style is not None:
+                    pcap.style = figure_caption_style
+            # 图片本身（或占位段落）就占了一个主体段落
+            any_paragraph_yet = True
             continue
 
         if isinstance(block, PageBreakBlock):
-            doc.add_page_break()
+            _insert_page_break_before(leader)
+            any_paragraph_yet = True
             continue
 
         if isinstance(block, SectionBreakBlock):
+            # add_section 会生成携带 sectPr 的新段落
             doc.add_section(WD_SECTION.NEW_PAGE)
+            _move_body_tail_before(leader)
+            any_paragraph_yet = True
             continue
 
         if isinstance(block, BibliographyBlock):
-            for it in block.items:
-                p = doc.add_paragraph(it)
-                if "Reference" in doc.styles:
-                    p.style = doc.styles["Reference"]
+            if block.items:
+                any_paragraph_yet = True
+            if len(block.items) >= _BULK_BIB_THRESHOLD:
+                # 大参考文献列表：整块拼 XML 一次解析插入，
+                # 避免逐条走 python-docx 的段落/样式对象层
+                _insert_bibliography_bulk(leader, block.items, reference_style)
+            else:
+                for it in block.items:
+                    p = leader.insert_paragraph_before(it)
+                    if reference_style is not None:
+                        p.style = reference_style
             continue
 
+    # 移除 leader 哨兵段落
+    leader._p.getparent().remove(leader._p)
+
+    if need_page_numbering:
+        _ensure_footer_page_numbers(doc, spec, styles)
+        _apply_page_numbering_ooxml(doc, spec)
     out = io.BytesIO()
     doc.save(out)
-    data = out.getvalue()
-    if need_page_numbering:
-        _ensure_footer_page_numbers(doc, spec)
-        out = io.BytesIO()
-        doc.save(out)
-        data = out.getvalue()
-        data = _apply_page_numbering_ooxml(data, spec)
-    return data
+    return out.getvalue()
 
 
-def _render_cover(doc: Document, ast: DocumentAST) -> None:
+def _render_cover(doc: Document, ast: DocumentAST, styles: dict) -> None:
     if ast.meta.title_cn:
         p = doc.add_paragraph(ast.meta.title_cn)
-        if "TitleCN" in doc.styles:
-            p.style = doc.styles["TitleCN"]
+        if styles.get("TitleCN") is not None:
+            p.style = styles["TitleCN"]
     if ast.meta.title_en:
         p = doc.add_paragraph(ast.meta.title_en)
-        if "TitleEN" in doc.styles:
-            p.style = doc.styles["TitleEN"]
+        if styles.get("TitleEN") is not None:
+            p.style = styles["TitleEN"]
 
     meta_parts = []
     if ast.meta.major:
@@ -532,17 +781,19 @@ def _render_cover(doc: Document, ast: DocumentAST) -> None:
         meta_parts.append(f"学生：{ast.meta.author}")
     if ast.meta.tutor:
         meta_parts.append(f"指导教师：{ast.meta.tutor}")
+    meta_style = styles.get("MetaLine")
     for line in meta_parts:
         p = doc.add_paragraph(line)
-        if "MetaLine" in doc.styles:
-            p.style = doc.styles["MetaLine"]
+        if meta_style is not None:
+            p.style = meta_style
 
 
-def _ensure_footer_page_numbers(doc: Document, spec: StyleSpec) -> None:
+def _ensure_footer_page_numbers(doc: Document, spec: StyleSpec, styles: dict) -> None:
     pn = spec.page_numbering
     if not pn or not pn.enabled or not pn.show_in_footer:
         return
 
+    page_number_style = styles.get("PageNumber")
     for section in doc.sections:
         footer = section.footer
         p = footer.paragraphs[0] if footer.paragraphs else footer.add_paragraph()
@@ -551,46 +802,50 @@ def _ensure_footer_page_numbers(doc: Document, spec: StyleSpec) -> None:
                 p._p.remove(r._r)
             except Exception:
                 pass
-        if "PageNumber" in doc.styles:
-            p.style = doc.styles["PageNumber"]
+        if page_number_style is not None:
+            p.style = page_number_style
         p.alignment = _align_to_docx(pn.footer_alignment)
         run = p.add_run()
-        fld = OxmlElement("w:fldSimple")
-        fld.set(qn("w:instr"), "PAGE")
-        run._r.append(fld)
+        run._r.append(deepcopy(_PAGE_FLD_TEMPLATE))
 
 
 def _normalize_cn_keywords(txt: str) -> str:
-    parts = [p for p in re.split(r"[，,;；\s]+", txt) if p]
+    parts = [p for p in _CN_KW_SPLIT.split(txt) if p]
     return "　".join(parts)
 
 
 def _normalize_en_keywords(txt: str) -> str:
-    parts = [p.strip() for p in re.split(r"[;；,，]+", txt) if p.strip()]
+    parts = [p.strip() for p in _EN_KW_SPLIT.split(txt) if p.strip()]
     return "; ".join(parts)
 
 
+# 域代码元素模板：解析一次，使用处 deepcopy，
+# 免去每次 OxmlElement 注册表查找 + qn() 拼接
+_PAGE_FLD_TEMPLATE = etree.fromstring(
+    f'<w:fldSimple xmlns:w="{_W_NS}" w:instr="PAGE"/>'
+)
+_TOC_FLD_TEMPLATE = etree.fromstring(
+    f'<w:fldSimple xmlns:w="{_W_NS}" w:instr=""/>'
+)
+
+
+# 三线表边框固定不变：模板只解析一次，每张表 deepcopy 挂载，
+# 免去逐条 find/OxmlElement/set 构建六个边框元素
+_TBL_BORDERS_TEMPLATE = etree.fromstring(
+    f'<w:tblBorders xmlns:w="{_W_NS}">'
+    '<w:top w:val="single" w:sz="12" w:space="0" w:color="000000"/>'
+    '<w:bottom w:val="single" w:sz="12" w:space="0" w:color="000000"/>'
+    '<w:insideH w:val="single" w:sz="6" w:space="0" w:color="000000"/>'
+    '<w:left w:val="nil" w:sz="0" w:space="0" w:color="000000"/>'
+    '<w:right w:val="nil" w:sz="0" w:space="0" w:color="000000"/>'
+    '<w:insideV w:val="nil" w:sz="0" w:space="0" w:color="000000"/>'
+    "</w:tblBorders>"
+)
+
+
 def _apply_three_line_table(table) -> None:
-    tbl = table._tbl
-    tblPr = tbl.tblPr
-    tblBorders = tblPr.find(qn("w:tblBorders"))
-    if tblBorders is None:
-        tblBorders = OxmlElement("w:tblBorders")
-        tblPr.append(tblBorders)
-
-    def _border(tag: str, val: str, sz: int):
-        el = tblBorders.find(qn(f"w:{tag}"))
-        if el is None:
-            el = OxmlElement(f"w:{tag}")
-            tblBorders.append(el)
-        el.set(qn("w:val"), val)
-        el.set(qn("w:sz"), str(sz))
-        el.set(qn("w:space"), "0")
-        el.set(qn("w:color"), "000000")
-
-    _border("top", "single", 12)
-    _border("bottom", "single", 12)
-    _border("insideH", "single", 6)
-    _border("left", "nil", 0)
-    _border("right", "nil", 0)
-    _border("insideV", "nil", 0)
+    tblPr = table._tbl.tblPr
+    existing = tblPr.find(qn("w:tblBorders"))
+    if existing is not None:
+        tblPr.remove(existing)
+    tblPr.append(deepcopy(_TBL_BORDERS_TEMPLATE))